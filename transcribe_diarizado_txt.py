@@ -2,14 +2,45 @@ import argparse
 import os
 import re
 import json
+import queue
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
+import numpy as np
+import soundfile as sf
 import torch
+import torch.nn.functional as F
 import torchaudio
-from fuzzywuzzy import fuzz
-import whisper
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+from faster_whisper import BatchedInferencePipeline, WhisperModel
 from pyannote.audio import Pipeline
+from sklearn.cluster import SpectralClustering
+from speechbrain.inference.speaker import EncoderClassifier
+
+
+# Sample rate expected by both Whisper and the diarization pipeline
+SAMPLE_RATE = 16000
+
+# Patterns used by limpar_repeticoes, compiled once instead of on every turn.
+# The repetition patterns run on a lowercased copy of the text (see _subn_ignorando_caixa),
+# so they need no IGNORECASE flag.
+_SPLIT_SENT = re.compile(r"[.!?]+")
+_PADRAO_ALT = re.compile(r"(\b\w+\b\s+\b\w+\b\s+)\1")
+_PADRAO_REP = re.compile(r"\b(\w+(?:\s+\w+)?)(?:\s+\1){2,}\b")
+
+# Case transform for _preserve_case, keyed by (isupper, istitle, islower) of the original word
+_CASOS = {
+    (True, False, False): str.upper,
+    (True, True, False): str.upper,  # single capital letter, e.g. "A"
+    (False, True, False): str.capitalize,
+    (False, False, True): str.lower,
+}
 
 
 # --------------------------
@@ -22,94 +53,351 @@ def _preserve_case(orig: str, new: str) -> str:
     - If original is UPPERCASE, keep result in UPPERCASE.
     - If original is Title Case, keep result in Title Case.
     - If original is lowercase, keep result in lowercase.
+    - Otherwise (mixed case, no letters), keep result as given.
     """
-    if orig.isupper():
-        return new.upper()
-    elif orig.istitle():
-        return new.capitalize()
-    else:
-        return new.lower() if orig.islower() else new
+    return _CASOS.get((orig.isupper(), orig.istitle(), orig.islower()), str)(new)
 
 
-def aplicar_dicionario(texto: str, dicionario: Dict[str, str], threshold: int = 80) -> str:
+def aplicar_dicionario(texto: str, chaves_lower: List[str], valores: List[str], threshold: int = 80) -> str:
     """
     Apply a fuzzy dictionary to correct near-miss words.
-    - `dicionario`: dictionary with key=wrong word, value=correct word
+    - `chaves_lower`: lowercased dictionary keys (wrong words), precomputed once in `main`
+    - `valores`: correct words, aligned index by index with `chaves_lower`
     - `threshold`: minimum fuzzy matching score to consider a replacement
     """
     words = texto.split()
-    for i, word in enumerate(words):
-        best_match = None
-        best_score = 0
-        # Compare each word against dictionary entries using fuzzy ratio
-        for orig, corr in dicionario.items():
-            score = fuzz.ratio(word.lower(), orig.lower())
-            if score > best_score and score >= threshold:
-                best_score = score
-                best_match = corr
-        if best_match:
-            words[i] = _preserve_case(word, best_match)
+    if not words or not chaves_lower:
+        return " ".join(words)
+    # Similarity of every word against every dictionary entry in a single RapidFuzz call;
+    # scores below the threshold come back as 0
+    scores = cdist([w.lower() for w in words], chaves_lower, scorer=fuzz.ratio,
+                   score_cutoff=threshold, workers=-1)
+    best = scores.argmax(axis=1)
+    best_scores = scores.max(axis=1)
+    for i in np.flatnonzero((best_scores >= threshold) & (best_scores > 0)):
+        words[i] = _preserve_case(words[i], valores[best[i]])
     return " ".join(words)
 
 
+def _subn_ignorando_caixa(padrao: re.Pattern, texto: str) -> Tuple[str, int]:
+    """
+    Case-insensitive `padrao.subn(r"\1", texto)` that lowercases the text once.
+    - Matches run on `texto.lower()` without IGNORECASE (no per-character casefolding)
+    - The kept group is copied from `texto` at the same offsets, preserving the original case
+    """
+    texto_lower = texto.lower()
+    if len(texto_lower) != len(texto):
+        # Rare characters change length when lowercased; offsets would not line up
+        return re.compile(padrao.pattern, re.IGNORECASE).subn(r"\1", texto)
+    partes = []
+    pos = 0
+    for m in padrao.finditer(texto_lower):
+        partes.append(texto[pos:m.start()])
+        partes.append(texto[m.start(1):m.end(1)])
+        pos = m.end()
+    partes.append(texto[pos:])
+    return "".join(partes), len(partes) // 2
+
+
 def limpar_repeticoes(texto: str, max_reps: int = 2) -> str:
     """
-    Remove repeated words and long phrase duplications.
+    Remove repeated words and long phrase duplications left over after decoding.
     - Splits the text into sentences
     - Keeps sentences with fewer repetitions than max_reps
     - Applies regex patterns to remove duplicated sequences
     """
-    sentences = re.split(r"[.!?]+", texto)
+    sentences = [s.strip() for s in _SPLIT_SENT.split(texto)]
+    # Lowercase each sentence once and count them in one pass instead of rescanning the text
+    sentences_lower = [s.lower() for s in sentences]
+    counts = Counter(sentences_lower)
     cleaned_sentences = []
-    for sent in sentences:
-        sent = sent.strip()
+    for sent, sent_lower in zip(sentences, sentences_lower):
         if not sent:
             continue
         words = sent.split()
         if len(words) < 3:
             cleaned_sentences.append(sent)
             continue
-        count = len(re.findall(re.escape(sent), texto, re.IGNORECASE))
-        if count <= max_reps:
+        if counts[sent_lower] <= max_reps:
             cleaned_sentences.append(sent)
     texto = ". ".join(cleaned_sentences) + "."
 
     # Regex to remove alternating repeated sequences (e.g., "yes yes yes")
-    padrao_alt = re.compile(r"(\b\w+\b\s+\b\w+\b\s+)\1", re.IGNORECASE)
-    texto = padrao_alt.sub(r"\1", texto)
+    texto, _ = _subn_ignorando_caixa(_PADRAO_ALT, texto)
 
-    # Regex to remove triple repetitions of a word or short phrase
-    padrao_rep = re.compile(r"\b(\w+(?:\s+\w+)?)\s+\1\s+\1\b", re.IGNORECASE)
-    while padrao_rep.search(texto):
-        texto = padrao_rep.sub(r"\1", texto)
+    # Regex to collapse runs of three or more repetitions of a word or short phrase in one pass
+    texto, _ = _subn_ignorando_caixa(_PADRAO_REP, texto)
     return texto.strip()
 
 
+def _carregar_audio(wav_path: Path) -> torch.Tensor:
+    """
+    Decode a .wav file into a mono float tensor of shape (1, samples) at SAMPLE_RATE.
+    """
+    waveform, sr = torchaudio.load(str(wav_path))
+    if waveform.shape[0] > 1:
+        waveform = waveform.mean(dim=0, keepdim=True)
+    if sr != SAMPLE_RATE:
+        waveform = torchaudio.functional.resample(waveform, sr, SAMPLE_RATE)
+    return waveform
+
+
+def _duracao(wav_path: Path) -> float:
+    """
+    Duration of a .wav file in seconds, read from its header without decoding it.
+    Unreadable files report 0 and are left for the loader to flag.
+    """
+    try:
+        info = sf.info(str(wav_path))
+    except (RuntimeError, OSError) as e:
+        print(f"⚠️ Could not read the header of {wav_path.name}: {e}")
+        return 0.0
+    return info.frames / info.samplerate
+
+
+def _carregar_silero() -> Tuple:
+    """
+    Load the Silero VAD model.
+    Returns a (vad_model, get_speech_timestamps) tuple; the model keeps internal state,
+    so each thread that runs VAD needs its own instance.
+    """
+    vad_model, vad_utils = torch.hub.load("snakers4/silero-vad", "silero_vad")
+    return vad_model, vad_utils[0]
+
+
+def _agrupar_fala(speech: List[Dict[str, int]], max_dur: float = 30.0) -> List[Dict[str, float]]:
+    """
+    Group Silero speech regions (in samples) into windows of at most `max_dur` seconds,
+    in the `clip_timestamps` format of faster-whisper (seconds).
+    - Consecutive regions are merged while the window fits in `max_dur`
+    - Regions longer than `max_dur` are split
+    """
+    max_len = int(max_dur * SAMPLE_RATE)
+    janelas = []
+    for ts in speech:
+        start, end = ts["start"], ts["end"]
+        if janelas and end - janelas[-1][0] <= max_len:
+            janelas[-1][1] = end
+            continue
+        while end - start > max_len:
+            janelas.append([start, start + max_len])
+            start += max_len
+        janelas.append([start, end])
+    return [{"start": a / SAMPLE_RATE, "end": b / SAMPLE_RATE} for a, b in janelas]
+
+
+# --------------------------
+# Lightweight diarization
+# --------------------------
+
+class _Turno(NamedTuple):
+    """Speaker turn boundaries in seconds (same attributes as a PyAnnote Segment)."""
+    start: float
+    end: float
+
+
+class _Diarizacao:
+    """
+    Diarization result exposing the `itertracks(yield_label=True)` interface of PyAnnote's Annotation.
+    """
+
+    def __init__(self, turnos: List[Tuple[_Turno, str]]):
+        self.turnos = turnos
+
+    def itertracks(self, yield_label: bool = False):
+        for turno, speaker in self.turnos:
+            yield (turno, None, speaker) if yield_label else (turno, None)
+
+
+class SimpleDiarization:
+    """
+    Lightweight alternative to the PyAnnote pipeline for short 2-speaker calls.
+    - Detects speech regions with Silero VAD
+    - Embeds short sliding windows of speech with an ECAPA speaker model
+    - Groups the windows into `num_speakers` speakers with spectral clustering
+    Called like a PyAnnote pipeline with an in-memory `{"waveform", "sample_rate"}` file;
+    Silero speech timestamps already computed for the file can be passed under `"speech"`.
+    With `compile_model`, the ECAPA network is compiled with `torch.compile` once at load time.
+    """
+
+    def __init__(self, window: float = 1.5, step: float = 0.75, batch_size: int = 64, device: str = "cpu",
+                 compile_model: bool = False):
+        self.vad = None  # own Silero VAD, loaded only if a file arrives without "speech"
+        self.encoder = EncoderClassifier.from_hparams(source="speechbrain/spkrec-ecapa-voxceleb",
+                                                      run_opts={"device": device})
+        self.device = torch.device(device)
+        self.window = int(window * SAMPLE_RATE)
+        self.step = int(step * SAMPLE_RATE)
+        self.batch_size = batch_size
+        # On CUDA the compiled model replays CUDA graphs, which need a fixed batch shape
+        self.cuda_graphs = compile_model and self.device.type == "cuda"
+        if compile_model:
+            # The graph compiles once and is reused for every file; warm it up here instead of
+            # on the first file. On CPU the batch dimension is dynamic, so short calls are not
+            # padded to a full batch; the warm-up uses two windows because dynamo specializes
+            # sizes 0 and 1, and a batch of 1 would compile a graph fixed to that size.
+            if self.cuda_graphs:
+                compiled = torch.compile(self.encoder.mods.embedding_model, mode="reduce-overhead")
+            else:
+                compiled = torch.compile(self.encoder.mods.embedding_model, dynamic=True)
+            self.encoder.mods.embedding_model = compiled
+            self._embeddings(torch.zeros(self.window), [(0, self.window, 0)] * 2)
+
+    def _janelas(self, speech: List[Dict[str, int]]) -> List[Tuple[int, int, int]]:
+        """
+        Split VAD speech regions into overlapping windows.
+        Returns (start, end, region) sample offsets, where `region` indexes the speech region.
+        """
+        janelas = []
+        for region, ts in enumerate(speech):
+            pos = ts["start"]
+            while True:
+                stop = min(pos + self.window, ts["end"])
+                janelas.append((pos, stop, region))
+                if stop >= ts["end"]:
+                    break
+                pos += self.step
+        return janelas
+
+    def _embeddings(self, audio: torch.Tensor, janelas: List[Tuple[int, int, int]]) -> torch.Tensor:
+        """
+        Compute L2-normalized speaker embeddings for each window, in batches.
+        """
+        embeddings = []
+        for i in range(0, len(janelas), self.batch_size):
+            lote = janelas[i:i + self.batch_size]
+            # Pad the last window of each region to a fixed length; wav_lens masks the padding
+            batch = torch.stack([F.pad(audio[a:b], (0, self.window - (b - a))) for a, b, _ in lote])
+            wav_lens = torch.tensor([(b - a) / self.window for a, b, _ in lote])
+            if self.cuda_graphs and len(lote) < self.batch_size:
+                # CUDA graphs replay a fixed shape: pad the last batch with silent windows
+                batch = F.pad(batch, (0, 0, 0, self.batch_size - len(lote)))
+                wav_lens = F.pad(wav_lens, (0, self.batch_size - len(lote)), value=1.0)
+            batch, wav_lens = batch.to(self.device), wav_lens.to(self.device)
+            with torch.inference_mode():
+                emb = self.encoder.encode_batch(batch, wav_lens=wav_lens).squeeze(1)
+            # Clone: CUDA graph replays write every output into the same static buffer
+            embeddings.append(emb[:len(lote)].clone() if self.cuda_graphs else emb[:len(lote)])
+        return F.normalize(torch.cat(embeddings), dim=1)
+
+    def __call__(self, file: dict, num_speakers: int = 2) -> _Diarizacao:
+        audio = file["waveform"].squeeze(0)
+        speech = file.get("speech")
+        if speech is None:
+            if self.vad is None:
+                self.vad = _carregar_silero()
+            vad_model, get_speech_timestamps = self.vad
+            speech = get_speech_timestamps(audio, vad_model, sampling_rate=SAMPLE_RATE)
+        janelas = self._janelas(speech)
+        if not janelas:
+            return _Diarizacao([])
+
+        if len(janelas) < num_speakers:
+            labels = [0] * len(janelas)
+        else:
+            emb = self._embeddings(audio, janelas)
+            # Cosine similarity mapped to [0, 1] as a precomputed affinity matrix
+            affinity = ((emb @ emb.T + 1) / 2).cpu().numpy()
+            labels = SpectralClustering(n_clusters=num_speakers, affinity="precomputed",
+                                        random_state=0).fit_predict(affinity)
+
+        # Each window owns the audio up to the start of the next window in the same region;
+        # consecutive windows with the same speaker are merged into a single turn
+        turnos = []
+        for i, (a, b, region) in enumerate(janelas):
+            if i + 1 < len(janelas) and janelas[i + 1][2] == region:
+                b = janelas[i + 1][0]
+            speaker = f"SPEAKER_{labels[i]:02d}"
+            if turnos and turnos[-1][2:] == [speaker, region]:
+                turnos[-1][1] = b
+            else:
+                turnos.append([a, b, speaker, region])
+
+        return _Diarizacao([(_Turno(a / SAMPLE_RATE, b / SAMPLE_RATE), speaker)
+                            for a, b, speaker, _ in turnos])
+
+
 # --------------------------
 # Main transcription + diarization
 # --------------------------
 
-def transcribe_and_diarize(wav_path: Path, whisper_model, diar_model, dicionario: Dict[str, str]) -> str:
+def _transcrever(audios: List[Tuple[torch.Tensor, List[Dict[str, int]]]], whisper_model,
+                 batch_size: int) -> List[List[dict]]:
     """
-    Perform speaker diarization and transcription for a single .wav audio file.
-    Steps:
-    1. Run diarization model (PyAnnote) to detect turns and speakers.
-    2. If only one speaker is detected, apply a fallback alternating assignment.
-    3. Transcribe audio with Whisper in Portuguese.
-    4. Align segments with diarized turns and assign text to speakers.
-    5. Clean text (remove repetitions + apply dictionary corrections).
-    6. Return formatted text with speaker labels.
+    Transcribe the speech regions of a group of decoded files with a single batched faster-whisper call.
+    - The files are concatenated and their speech windows passed as `clip_timestamps`, so windows
+      from several short files share the same GPU batches
+    - Returns, per file, the segments as dicts with `start`, `end` and `text` keys (file-relative)
+    """
+    resultados = [[] for _ in audios]
+    inicios = []
+    clips = []
+    offset = 0
+    for waveform, speech in audios:
+        inicio = offset / SAMPLE_RATE
+        inicios.append(inicio)
+        clips.extend({"start": c["start"] + inicio, "end": c["end"] + inicio} for c in _agrupar_fala(speech))
+        offset += waveform.shape[-1]
+    if not clips:
+        return resultados  # no speech detected: skip Whisper entirely
+
+    # Passing the samples directly skips faster-whisper's own ffmpeg decode of the files
+    audio = torch.cat([waveform.squeeze(0) for waveform, _ in audios]).numpy()
+    # Only the ≤30 s windows around detected speech are sent to the encoder.
+    # The batched pipeline forces condition_on_previous_text off, so a hallucinated loop cannot
+    # seed the next window. no_repeat_ngram_size stops the decoder from emitting the same
+    # 10-token sequence (BPE tokens, roughly 4-6 Portuguese words) twice in a window, which cuts
+    # repetition loops at the source while still allowing short repeated phrases.
+    # Timestamps are predicted so each window is split into short sub-segments; otherwise the
+    # pipeline returns one segment per (up to 30 s) window and its text would be attached to
+    # every diarization turn it overlaps.
+    segments_iter, _ = whisper_model.transcribe(audio, language="pt", batch_size=batch_size,
+                                                clip_timestamps=clips,
+                                                without_timestamps=False,
+                                                no_repeat_ngram_size=10)
+    # faster-whisper yields segments lazily; consume them here so decoding happens in this thread.
+    # Windows never cross file boundaries, so each segment's midpoint identifies its file.
+    for s in segments_iter:
+        # The batched pipeline has no temperature fallback and ignores the compression-ratio and
+        # no-speech thresholds, so apply Whisper's guards here: drop highly repetitive output
+        # and likely-silent windows decoded with low confidence
+        if s.compression_ratio > 2.4:
+            continue
+        if s.no_speech_prob > 0.6 and s.avg_logprob < -1.0:
+            continue
+        i = bisect_right(inicios, (s.start + s.end) / 2) - 1
+        resultados[i].append({"start": max(0.0, s.start - inicios[i]), "end": s.end - inicios[i],
+                              "text": s.text})
+    return resultados
+
+
+def _diarizar(diar_model, waveform: torch.Tensor, speech: List[Dict[str, int]], num_speakers: int = 2):
+    """
+    Run the diarization pipeline on a decoded file with autograd disabled.
+    `torch.inference_mode` is thread-local, so it is entered in the calling thread itself.
     """
-    print(f"   📊 Running diarization...")
-    diar = diar_model({"audio": str(wav_path)}, num_speakers=2)
+    with torch.inference_mode():
+        return diar_model({"waveform": waveform, "sample_rate": SAMPLE_RATE, "speech": speech},
+                          num_speakers=num_speakers)
+
 
+def _atribuir_falantes(nome: str, diar, segments: List[dict], chaves_lower: List[str], valores: List[str]) -> str:
+    """
+    Combine the diarization and the transcription segments of a single file.
+    `nome` is the file name, used to label the log lines.
+    Steps:
+    1. If only one speaker is detected, apply a fallback alternating assignment.
+    2. Align segments with diarized turns and assign text to speakers.
+    3. Clean text (remove repetitions + apply dictionary corrections).
+    4. Return formatted text with speaker labels.
+    """
     turns = list(diar.itertracks(yield_label=True))
     speakers_detected = set([speaker for _, _, speaker in turns])
-    print(f"   📊 {len(turns)} turns detected | Speakers: {speakers_detected}")
+    print(f"   📊 {nome}: {len(turns)} turns detected | Speakers: {speakers_detected}")
 
     # Fallback: if diarization finds only 1 speaker, alternate between 2
     if len(speakers_detected) == 1:
-        print("   ⚠️ Only 1 speaker detected – applying alternating fallback...")
+        print(f"   ⚠️ {nome}: only 1 speaker detected – applying alternating fallback...")
         new_turns = []
         alt_speakers = ["SPEAKER_00", "SPEAKER_01"]
         for idx, (turn, _, _) in enumerate(turns):
@@ -117,9 +405,11 @@ def transcribe_and_diarize(wav_path: Path, whisper_model, diar_model, dicionario
             new_turns.append((turn, None, speaker))
         turns = new_turns
 
-    print(f"   📝 Transcribing with Whisper...")
-    result = whisper_model.transcribe(str(wav_path), language="pt")
-    segments = result["segments"]
+    segments.sort(key=lambda seg: seg["start"])
+    seg_starts = [seg["start"] for seg in segments]
+    # Running maximum of segment ends: every segment before the first index whose
+    # running end exceeds a turn's start finishes before that turn begins
+    seg_ends_max = list(accumulate((seg["end"] for seg in segments), max))
 
     output = []
     for turn, _, speaker in turns:
@@ -128,20 +418,166 @@ def transcribe_and_diarize(wav_path: Path, whisper_model, diar_model, dicionario
             continue  # ignore very short segments
 
         spoken_parts = []
-        # Collect transcription segments inside the diarization window
-        for seg in segments:
+        # Collect transcription segments inside the diarization window, scanning
+        # only from the first candidate to the last segment starting before `end`
+        first = bisect_right(seg_ends_max, start)
+        last = bisect_left(seg_starts, end, lo=first)
+        for seg in segments[first:last]:
             if seg["end"] > start and seg["start"] < end:
                 spoken_parts.append(seg["text"].strip())
 
         if spoken_parts:
             text = " ".join(spoken_parts)
             text = limpar_repeticoes(text)
-            text = aplicar_dicionario(text, dicionario)
+            text = aplicar_dicionario(text, chaves_lower, valores)
             output.append(f"[{speaker}] {text}")
 
     return "\n".join(output)
 
 
+def transcribe_and_diarize(audios: List[Tuple[torch.Tensor, List[Dict[str, int]]]], nomes: List[str],
+                           whisper_model, diar_model, chaves_lower: List[str], valores: List[str],
+                           batch_size: int = 16) -> List[Optional[str]]:
+    """
+    Perform speaker diarization and transcription for a group of .wav audio files.
+    `audios` holds, per file, the waveform decoded once by `_carregar_audio` and its
+    Silero VAD speech regions (in samples); `nomes` holds the matching file names.
+    Steps:
+    1. Transcribe all files with one batched faster-whisper call in Portuguese while, in parallel,
+       the diarization model (SimpleDiarization or PyAnnote) runs on each file in turn.
+    2. Combine each file's turns and segments with `_atribuir_falantes`.
+    Returns the formatted text of each file, in the order of `audios`; a file whose diarization
+    or speaker assignment fails is logged and returned as `None`, without affecting the others.
+    """
+    print(f"   📊 Running diarization and 📝 Whisper transcription of {len(audios)} file(s) in parallel...")
+    # Both passes are independent and spend most of their time in native code,
+    # so the wall-clock per group becomes the slower of the two instead of the sum
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        fut_segments = executor.submit(_transcrever, audios, whisper_model, batch_size)
+        diars = []
+        for nome, (waveform, speech) in zip(nomes, audios):
+            try:
+                diars.append(_diarizar(diar_model, waveform, speech))
+            except Exception as e:
+                print(f"❌ Error in {nome} (diarization): {e}")
+                diars.append(None)
+        segmentos = fut_segments.result()
+
+    texts = []
+    for nome, diar, segments in zip(nomes, diars, segmentos):
+        if diar is None:
+            texts.append(None)
+            continue
+        try:
+            texts.append(_atribuir_falantes(nome, diar, segments, chaves_lower, valores))
+        except Exception as e:
+            print(f"❌ Error in {nome}: {e}")
+            texts.append(None)
+    return texts
+
+
+# --------------------------
+# Batch pipeline
+# --------------------------
+
+def _carregar_modelos(args: argparse.Namespace, device: str, device_index: int = 0,
+                      cpu_threads: int = 0) -> Tuple:
+    """
+    Load one faster-whisper pipeline and one diarization pipeline for a consumer.
+    `cpu_threads` is the number of CTranslate2 CPU threads (0 keeps its default).
+    Returns a (whisper_model, diar_model) tuple.
+    """
+    compute_type = args.compute_type or ("float16" if device == "cuda" else "int8")
+    label = f"{device}:{device_index}" if device == "cuda" else device
+    print(f"🧠 Loading Whisper ({args.model}, device={label}, compute_type={compute_type})…")
+    # CTranslate2 uses only 4 CPU threads by default; `cpu_threads` is its share of the cores
+    model = WhisperModel(args.model, device=device, device_index=device_index, compute_type=compute_type,
+                         cpu_threads=cpu_threads)
+    whisper_model = BatchedInferencePipeline(model=model)
+
+    if args.diar_backend == "pyannote":
+        print(f"🧠 Loading diarization model ({args.diar_model}, device={label})…")
+        hf_token = os.getenv("HUGGINGFACE_TOKEN")
+        diar_model = Pipeline.from_pretrained(args.diar_model, use_auth_token=hf_token)
+        diar_model.to(torch.device(label))
+    else:
+        print(f"🧠 Loading diarization model (Silero VAD + ECAPA + spectral clustering, device={label})…")
+        diar_model = SimpleDiarization(device=label, compile_model=args.compile)
+    return whisper_model, diar_model
+
+
+def _produzir_audios(wavs: List[Path], fila: queue.Queue, n_consumidores: int, vad: Tuple) -> None:
+    """
+    Loader thread: decode the next files and run Silero VAD on them while the consumers
+    are busy with the current ones.
+    - `vad` is the (vad_model, get_speech_timestamps) tuple from `_carregar_silero`, used only here
+    Puts (idx, wav_path, waveform, speech) items on `fila`, then one `None` stop marker per consumer.
+    """
+    vad_model, get_speech_timestamps = vad
+    try:
+        for idx, wav_path in enumerate(wavs, 1):
+            try:
+                waveform = _carregar_audio(wav_path)
+                with torch.inference_mode():
+                    speech = get_speech_timestamps(waveform.squeeze(0), vad_model, sampling_rate=SAMPLE_RATE)
+                fila.put((idx, wav_path, waveform, speech))
+            except Exception as e:
+                print(f"❌ Error loading {wav_path.name}: {e}")
+    finally:
+        # Always release the consumers, even if the loader dies unexpectedly
+        for _ in range(n_consumidores):
+            fila.put(None)
+
+
+def _proximo_lote(fila: queue.Queue, batch_size: int) -> Tuple[List[tuple], bool]:
+    """
+    Take decoded files from `fila` until their speech windows fill one Whisper batch.
+    Files are queued shortest first, so a group holds files of similar length.
+    Returns the group and whether the stop marker was reached.
+    """
+    lote = []
+    janelas = 0
+    while janelas < batch_size:
+        item = fila.get()
+        if item is None:
+            return lote, True
+        lote.append(item)
+        janelas += len(_agrupar_fala(item[3]))
+    return lote, False
+
+
+def _consumir_audios(fila: queue.Queue, whisper_model, diar_model, chaves_lower: List[str],
+                     valores: List[str], batch_size: int, output_dir: Path, total: int) -> None:
+    """
+    Consumer thread: transcribe and diarize groups of decoded files from `fila` until a stop marker arrives.
+    """
+    fim = False
+    while not fim:
+        lote, fim = _proximo_lote(fila, batch_size)
+        if not lote:
+            continue
+        for idx, wav_path, _, _ in lote:
+            print(f"\n🔄 Processing {wav_path.name} ({idx}/{total})...")
+        try:
+            texts = transcribe_and_diarize([(waveform, speech) for _, _, waveform, speech in lote],
+                                           [wav_path.name for _, wav_path, _, _ in lote],
+                                           whisper_model, diar_model, chaves_lower, valores, batch_size)
+        except Exception as e:
+            for _, wav_path, _, _ in lote:
+                print(f"❌ Error in {wav_path.name}: {e}")
+            continue
+        for (_, wav_path, _, _), text in zip(lote, texts):
+            if text is None:
+                continue  # failure already reported by transcribe_and_diarize
+            try:
+                out_file = output_dir / f"{wav_path.stem}.txt"
+                with open(out_file, "w", encoding="utf-8") as f:
+                    f.write(text)
+                print(f"✅ {wav_path.name} → {out_file}")
+            except Exception as e:
+                print(f"❌ Error in {wav_path.name}: {e}")
+
+
 # --------------------------
 # Command-line interface
 # --------------------------
@@ -150,9 +586,10 @@ def main():
     """
     Main CLI entry point.
     - Reads command-line arguments
-    - Loads Whisper + PyAnnote diarization models
+    - Loads faster-whisper + diarization models
     - Loads optional correction dictionary
-    - Processes all .wav files in input directory
+    - Processes the .wav files in input directory that have no transcript yet,
+      shortest first (loader thread + one consumer per GPU, all GPUs in use)
     - Saves diarized transcriptions to output directory
     """
     parser = argparse.ArgumentParser()
@@ -163,9 +600,19 @@ def main():
     parser.add_argument("--dict_path", type=str, default="../consultas_do_codigo/dicionario_televendas.txt",
                         help="Path to correction dictionary file (format: wrong=correct)")
     parser.add_argument("--model", type=str, default="medium",
-                        help="Whisper model size: tiny, base, small, medium, large")
+                        help="Whisper model size (tiny, base, small, medium, large) "
+                             "or path to a CTranslate2-converted model directory")
+    parser.add_argument("--compute_type", type=str, default=None,
+                        help="CTranslate2 weight quantization (e.g. int8, float16, int8_float16); "
+                             "defaults to float16 on GPU and int8 on CPU")
+    parser.add_argument("--batch_size", type=int, default=16,
+                        help="Number of audio chunks transcribed per batch by faster-whisper")
+    parser.add_argument("--diar_backend", type=str, default="simple", choices=["simple", "pyannote"],
+                        help="Diarization backend: lightweight VAD + clustering, or PyAnnote")
     parser.add_argument("--diar_model", type=str, default="pyannote/speaker-diarization-3.1",
-                        help="PyAnnote diarization model to use")
+                        help="PyAnnote diarization model to use (with --diar_backend pyannote)")
+    parser.add_argument("--compile", action="store_true",
+                        help="torch.compile the speaker embedding model (with --diar_backend simple)")
     args = parser.parse_args()
 
     input_dir = Path(args.input_dir)
@@ -175,33 +622,56 @@ def main():
     # Load dictionary (if available)
     dicionario = {}
     if Path(args.dict_path).exists():
-        with open(args.dict_path, "r", encoding="utf-8") as f:
-            for line in f:
-                if "=" in line:
-                    k, v = line.strip().split("=", 1)
-                    dicionario[k.strip()] = v.strip()
+        text = Path(args.dict_path).read_text(encoding="utf-8")
+        pares = dict(line.split("=", 1) for line in text.splitlines() if "=" in line)
+        dicionario = {k.strip(): v.strip() for k, v in pares.items()}
+    # Lowercased keys are computed once here instead of on every word
+    chaves_lower = [k.lower() for k in dicionario]
+    valores = list(dicionario.values())
 
-    print(f"🧠 Loading Whisper ({args.model}, device=cpu)…")
-    whisper_model = whisper.load_model(args.model)
-
-    print(f"🧠 Loading diarization model ({args.diar_model})…")
-    hf_token = os.getenv("HUGGINGFACE_TOKEN")
-    diar_model = Pipeline.from_pretrained(args.diar_model, use_auth_token=hf_token)
+    # Diarization (PyTorch) and Whisper (CTranslate2) run at the same time, so split the cores
+    # between them instead of letting both claim all of them: Whisper gets most, PyTorch the rest
+    n_cpu = os.cpu_count() or 1
+    torch_threads = max(1, n_cpu // 4)
+    whisper_threads = max(1, n_cpu - torch_threads)
+    torch.set_num_threads(torch_threads)
 
     wavs = list(input_dir.glob("*.wav"))
     print(f"🔎 {len(wavs)} audio files found for transcription")
 
-    # Process each audio file
-    for idx, wav_path in enumerate(wavs, 1):
-        print(f"\n🔄 Processing {wav_path.name} ({idx}/{len(wavs)})...")
-        try:
-            text = transcribe_and_diarize(wav_path, whisper_model, diar_model, dicionario)
-            out_file = output_dir / f"{wav_path.stem}.txt"
-            with open(out_file, "w", encoding="utf-8") as f:
-                f.write(text)
-            print(f"✅ {wav_path.name} → {out_file}")
-        except Exception as e:
-            print(f"❌ Error in {wav_path.name}: {e}")
+    # Incremental runs: skip files whose transcript already exists and is not empty
+    pendentes = []
+    for wav_path in wavs:
+        out_file = output_dir / f"{wav_path.stem}.txt"
+        if out_file.exists() and out_file.stat().st_size > 0:
+            continue
+        pendentes.append(wav_path)
+    if len(pendentes) < len(wavs):
+        print(f"⏭️ Skipping {len(wavs) - len(pendentes)} already transcribed files")
+    if not pendentes:
+        return
+    # Process files of similar duration together, so batched inference pads less
+    wavs = sorted(pendentes, key=_duracao)
+
+    # One consumer (with its own models) per GPU; a single consumer on CPU
+    n_gpu = torch.cuda.device_count()
+    device = "cuda" if n_gpu else "cpu"
+    modelos = [_carregar_modelos(args, device, i, whisper_threads) for i in range(max(1, n_gpu))]
+
+    # Bounded queue: the loader decodes at most two files ahead per consumer
+    fila = queue.Queue(maxsize=2 * len(modelos))
+    # Loaded here so a failure (e.g. no network or hub cache) stops the run instead of the loader thread
+    vad = _carregar_silero()
+    loader = threading.Thread(target=_produzir_audios, args=(wavs, fila, len(modelos), vad), daemon=True)
+    loader.start()
+    with ThreadPoolExecutor(max_workers=len(modelos)) as executor:
+        consumers = [
+            executor.submit(_consumir_audios, fila, whisper_model, diar_model, chaves_lower, valores,
+                            args.batch_size, output_dir, len(wavs))
+            for whisper_model, diar_model in modelos
+        ]
+        for consumer in consumers:
+            consumer.result()
 
 
 if __name__ == "__main__":